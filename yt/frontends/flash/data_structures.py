@@ -1,3 +1,4 @@
+import logging
 import os
 import weakref
 
@@ -8,22 +9,73 @@ from yt.data_objects.static_output import Dataset, ParticleFile, validate_index_
 from yt.funcs import mylog, setdefaultattr
 from yt.geometry.grid_geometry_handler import GridIndex
 from yt.geometry.particle_geometry_handler import ParticleIndex
-from yt.utilities.file_handler import HDF5FileHandler, warn_h5py
+from yt.utilities.file_handler import (
+    HDF5FileHandler,
+    valid_hdf5_signature,
+    warn_h5py,
+)
+from yt.utilities.lib.misc_utilities import children_to_csr
+from yt.utilities.on_demand_imports import _h5py as h5py
 from yt.utilities.physical_ratios import cm_per_mpc
 
 from .fields import FLASHFieldInfo
 
 
+def _read_dataset(handle, name, selection=()):
+    """
+    Return *selection* of the dataset *name* in *handle*.  Contiguous,
+    uncompressed datasets are memory-mapped straight from the file, which
+    skips the copy through the HDF5 library; anything else is read normally.
+    """
+    dset = handle[name]
+    offset = dset.id.get_offset()
+    if (
+        dset.chunks is None
+        and dset.compression is None
+        and offset is not None
+        and dset.size > 0
+        and dset.file.driver == "sec2"
+        and dset.file.userblock_size == 0
+    ):
+        return np.memmap(
+            dset.file.filename,
+            dtype=dset.dtype,
+            mode="r",
+            offset=offset,
+            shape=dset.shape,
+        )[selection]
+    return dset[selection]
+
+
 class FLASHGrid(AMRGridPatch):
     _id_offset = 1
     # __slots__ = ["_level_id", "stop_index"]
 
     def __init__(self, id, index, level):
         AMRGridPatch.__init__(self, id, filename=index.index_filename, index=index)
-        self.Parent = None
-        self.Children = []
         self.Level = level
 
+    # The grid tree lives on the index as flat arrays (see
+    # FLASHHierarchy._populate_grid_objects); these just look it up.
+    @property
+    def Parent(self):
+        p = self.index._parent_of[self.id - self._id_offset]
+        if p < 0:
+            return None
+        return self.index.grids[p]
+
+    @property
+    def Children(self):
+        h = self.index
+        gi = self.id - self._id_offset
+        start, end = h._child_indptr[gi], h._child_indptr[gi + 1]
+        return h.grids.take(h._child_indices[start:end]).tolist()
+
+    def _setup_dx(self):
+        # The index computes the cell widths of every grid up front
+        dds = self.index._grid_dds[self.id - self._id_offset]
+        self.dds = self.ds.arr(dds.copy(), "code_length")
+
     def __repr__(self):
         return "FLASHGrid_%04i (%s)" % (self.id, self.ActiveDimensions)
 
@@ -49,21 +101,25 @@ class FLASHHierarchy(GridIndex):
         pass
 
     def _detect_output_fields(self):
-        self.field_list = [
-            ("flash", s.decode("ascii", "ignore"))
-            for s in self._handle["/unknown names"][:].flat
-        ]
+        # Decode the fixed-width name arrays in one go rather than per element
+        unknown_names = np.char.decode(
+            self._handle["/unknown names"][:].ravel(), "ascii", "ignore"
+        )
+        self.field_list = [("flash", s) for s in unknown_names.tolist()]
         if "/particle names" in self._particle_handle:
+            particle_names = np.char.strip(
+                np.char.decode(
+                    self._particle_handle["/particle names"][:, 0], "ascii", "ignore"
+                )
+            )
             self.field_list += [
-                ("io", "particle_" + s[0].decode("ascii", "ignore").strip())
-                for s in self._particle_handle["/particle names"][:]
+                ("io", "particle_" + s) for s in particle_names.tolist()
             ]
 
     def _count_grids(self):
         try:
-            self.num_grids = self.dataset._find_parameter(
-                "integer", "globalnumblocks", True
-            )
+            # _parse_parameter_file has already read the integer scalars
+            self.num_grids = self.dataset.parameters["globalnumblocks"]
         except KeyError:
             try:
                 self.num_grids = self._handle["simulation parameters"]["total blocks"][
@@ -84,9 +140,12 @@ class FLASHHierarchy(GridIndex):
         for i in range(3):
             self.grid_left_edge[:, i] = DLE[i]
             self.grid_right_edge[:, i] = DRE[i]
+        # Read the bounding boxes once, rather than doing a separate (strided)
+        # read for each edge.
+        bbox = _read_dataset(f, "/bounding box")
         # We only go up to ND for 2D datasets
-        self.grid_left_edge[:, :ND] = f["/bounding box"][:, :ND, 0]
-        self.grid_right_edge[:, :ND] = f["/bounding box"][:, :ND, 1]
+        self.grid_left_edge[:, :ND] = bbox[:, :ND, 0]
+        self.grid_right_edge[:, :ND] = bbox[:, :ND, 1]
         # Move this to the parameter file
         try:
             nxb = ds.parameters["nxb"]
@@ -98,33 +157,28 @@ class FLASHHierarchy(GridIndex):
             ]
         self.grid_dimensions[:] *= (nxb, nyb, nzb)
         try:
-            self.grid_particle_count[:] = f_part["/localnp"][:][:, None]
+            # Read straight into our (contiguous) array; no temporaries
+            f_part["/localnp"].read_direct(self.grid_particle_count.reshape(-1))
         except KeyError:
             self.grid_particle_count[:] = 0.0
-        self._particle_indices = np.zeros(self.num_grids + 1, dtype="int64")
-        if self.num_grids > 1:
-            np.add.accumulate(
-                self.grid_particle_count.squeeze(), out=self._particle_indices[1:]
-            )
+        # Only fall back to 64-bit offsets when the particle count needs them
+        if self.grid_particle_count.sum(dtype="int64") > np.iinfo("int32").max:
+            pind_type = "int64"
         else:
-            self._particle_indices[1] = self.grid_particle_count.squeeze()
+            pind_type = "int32"
+        self._particle_indices = np.zeros(self.num_grids + 1, dtype=pind_type)
+        np.cumsum(self.grid_particle_count[:, 0], out=self._particle_indices[1:])
         # This will become redundant, as _prepare_grid will reset it to its
         # current value.  Note that FLASH uses 1-based indexing for refinement
         # levels, but we do not, so we reduce the level by 1.
-        self.grid_levels.flat[:] = f["/refine level"][:][:] - 1
+        np.subtract(_read_dataset(f, "/refine level"), 1, out=self.grid_levels[:, 0])
+        # Pull the levels out as Python ints up front; indexing grid_levels
+        # per grid would box a numpy scalar on every iteration.
+        levels = self.grid_levels[:, 0].tolist()
+        grid_cls = self.grid
         self.grids = np.empty(self.num_grids, dtype="object")
         for i in range(self.num_grids):
-            self.grids[i] = self.grid(i + 1, self, self.grid_levels[i, 0])
-
-        # This is a possibly slow and verbose fix, and should be re-examined!
-        rdx = self.dataset.domain_width / self.dataset.domain_dimensions
-        nlevels = self.grid_levels.max()
-        dxs = np.ones((nlevels + 1, 3), dtype="float64")
-        for i in range(nlevels + 1):
-            dxs[i, :ND] = rdx[:ND] / self.dataset.refine_by ** i
-
-        if ND < 3:
-            dxs[:, ND:] = rdx[ND:]
+            self.grids[i] = grid_cls(i + 1, self, levels[i])
 
         # Because we don't care about units, we're going to operate on views.
         gle = self.grid_left_edge.ndarray_view()
@@ -139,32 +193,48 @@ class FLASHHierarchy(GridIndex):
             return
 
     def _populate_grid_objects(self):
-        ii = np.argsort(self.grid_levels.flat)
-        gid = self._handle["/gid"][:]
+        # Refinement levels are small integers, so a stable sort on a narrow
+        # integer type lets numpy use a radix sort instead of quicksort.
+        ii = np.argsort(self.grid_levels[:, 0].astype("int8"), kind="stable")
         first_ind = -(self.dataset.refine_by ** self.dataset.dimensionality)
+        # We only need the children, which are the last columns of /gid, so
+        # only read those.
+        gid = _read_dataset(self._handle, "/gid", np.s_[:, first_ind:])
+        # astype always copies, so children_to_csr never sees a read-only map
+        gid = gid.astype("int64")
+        # Store the tree in CSR form: the children of grid i are
+        # _child_indices[_child_indptr[i]:_child_indptr[i + 1]], and
+        # _parent_of[i] is the parent of grid i (or -1).  All of these are
+        # 0-indexed, whereas FLASH uses 1-indexed group info.
+        self._child_indptr, self._child_indices, self._parent_of = children_to_csr(gid)
+        # Compute the cell widths of all grids the way AMRGridPatch._setup_dx
+        # would (root grids from their edges, everything else from its
+        # parent), but one level at a time rather than one grid at a time.
+        dds = (self.grid_right_edge.d - self.grid_left_edge.d) / self.grid_dimensions
+        levels = self.grid_levels[ii, 0]
+        # The levels are sorted, so the last one is the deepest.
+        self.max_level = int(levels[-1])
+        for level in range(1, self.max_level + 1):
+            start, end = np.searchsorted(levels, [level, level + 1])
+            gi = ii[start:end]
+            gi = gi[self._parent_of[gi] >= 0]
+            dds[gi] = dds[self._parent_of[gi]] / self.dataset.refine_by
+        DW = (self.dataset.domain_right_edge - self.dataset.domain_left_edge).d
+        if self.dataset.dimensionality < 3:
+            dds[:, 2] = DW[2]
+        if self.dataset.dimensionality < 2:
+            dds[:, 1] = DW[1]
+        self._grid_dds = dds
         for g in self.grids[ii].flat:
-            gi = g.id - g._id_offset
-            # FLASH uses 1-indexed group info
-            g.Children = [self.grids[i - 1] for i in gid[gi, first_ind:] if i > -1]
-            for g1 in g.Children:
-                g1.Parent = g
             g._prepare_grid()
             g._setup_dx()
-        if self.dataset.dimensionality < 3:
-            DD = self.dataset.domain_right_edge[2] - self.dataset.domain_left_edge[2]
-            for g in self.grids:
-                g.dds[2] = DD
-        if self.dataset.dimensionality < 2:
-            DD = self.dataset.domain_right_edge[1] - self.dataset.domain_left_edge[1]
-            for g in self.grids:
-                g.dds[1] = DD
-        self.max_level = self.grid_levels.max()
 
 
 class FLASHDataset(Dataset):
     _index_class = FLASHHierarchy
     _field_info_class = FLASHFieldInfo
     _handle = None
+    _particle_handle = None
 
     def __init__(
         self,
@@ -185,16 +255,22 @@ class FLASHDataset(Dataset):
 
         if self.particle_filename is None:
             # try to guess the particle filename
-            try:
-                self._particle_handle = HDF5FileHandler(
-                    filename.replace("plt_cnt", "part")
-                )
-                self.particle_filename = filename.replace("plt_cnt", "part")
+            self._particle_handle = self._handle
+            guess = filename.replace("plt_cnt", "part")
+            # If the name doesn't change (e.g. checkpoint files), the guess is
+            # this very file, which is already open.
+            if guess == filename:
+                self.particle_filename = filename
+            else:
+                try:
+                    self._particle_handle = HDF5FileHandler(guess)
+                    self.particle_filename = guess
+                except OSError:
+                    pass
+            if self.particle_filename is not None:
                 mylog.info(
                     "Particle file found: %s", self.particle_filename.split("/")[-1]
                 )
-            except OSError:
-                self._particle_handle = self._handle
         else:
             # particle_filename is specified by user
             self._particle_handle = HDF5FileHandler(self.particle_filename)
@@ -204,6 +280,7 @@ class FLASHDataset(Dataset):
             part_time = self._particle_handle.handle.get("real scalars")[0][1]
             plot_time = self._handle.handle.get("real scalars")[0][1]
             if not np.isclose(part_time, plot_time):
+                self._particle_handle.close()
                 self._particle_handle = self._handle
                 mylog.warning(
                     "%s and %s are not at the same time. "
@@ -297,24 +374,22 @@ class FLASHDataset(Dataset):
         for ptype in ["scalars", "runtime parameters"]:
             for vtype in ["integer", "real", "logical", "string"]:
                 hns.append(f"{vtype} {ptype}")
+        # Parameters that overwrite a simulation scalar of the same name;
+        # these are reported together once everything has been read.
+        overwritten = []
         if self._flash_version > 7:
             for hn in hns:
                 if hn not in self._handle:
                     continue
-                for varname, val in zip(
-                    self._handle[hn][:, "name"], self._handle[hn][:, "value"]
-                ):
+                table = self._handle[hn][:]
+                for varname, val in zip(table["name"], table["value"]):
                     vn = varname.strip()
                     if hn.startswith("string"):
                         pval = val.strip()
                     else:
                         pval = val
                     if vn in self.parameters and self.parameters[vn] != pval:
-                        mylog.info(
-                            "%s %s overwrites a simulation scalar of the same name",
-                            hn[:-1],
-                            vn,
-                        )
+                        overwritten.append((hn[:-1], vn))
                     if hasattr(pval, "decode"):
                         pval = pval.decode("ascii", "ignore")
                     self.parameters[vn.decode("ascii", "ignore")] = pval
@@ -322,15 +397,11 @@ class FLASHDataset(Dataset):
             for hn in hns:
                 if hn not in self._handle:
                     continue
+                table = self._handle[hn][:]
                 if hn == "simulation parameters":
-                    zipover = (
-                        (name, self._handle[hn][name][0])
-                        for name in self._handle[hn].dtype.names
-                    )
+                    zipover = ((name, table[name][0]) for name in table.dtype.names)
                 else:
-                    zipover = zip(
-                        self._handle[hn][:, "name"], self._handle[hn][:, "value"]
-                    )
+                    zipover = zip(table["name"], table["value"])
                 for varname, val in zipover:
                     vn = varname.strip()
                     if hasattr(vn, "decode"):
@@ -340,14 +411,16 @@ class FLASHDataset(Dataset):
                     else:
                         pval = val
                     if vn in self.parameters and self.parameters[vn] != pval:
-                        mylog.info(
-                            "%s %s overwrites a simulation scalar of the same name",
-                            hn[:-1],
-                            vn,
-                        )
+                        overwritten.append((hn[:-1], vn))
                     if hasattr(pval, "decode"):
                         pval = pval.decode("ascii", "ignore")
                     self.parameters[vn] = pval
+        if overwritten and mylog.isEnabledFor(logging.INFO):
+            mylog.info(
+                "%s parameter(s) overwrite a simulation scalar of the same name: %s",
+                len(overwritten),
+                ", ".join(f"{kind} {name}" for kind, name in overwritten),
+            )
 
         # Determine block size
         try:
@@ -453,10 +526,13 @@ class FLASHDataset(Dataset):
 
     @classmethod
     def _is_valid(self, *args, **kwargs):
+        # Checking the signature first keeps us from handing every non-HDF5
+        # candidate file to h5py.
+        if not valid_hdf5_signature(args[0]):
+            return False
         try:
-            fileh = HDF5FileHandler(args[0])
-            if "bounding box" in fileh["/"].keys():
-                return True
+            with h5py.File(args[0], mode="r") as fileh:
+                return "bounding box" in fileh
         except (OSError, ImportError):
             pass
         return False
@@ -470,6 +546,8 @@ class FLASHDataset(Dataset):
         return candidates, (len(candidates) == 0)
 
     def close(self):
+        if self._particle_handle not in (None, self._handle):
+            self._particle_handle.close()
         self._handle.close()
 
 
@@ -520,14 +598,12 @@ class FLASHParticleDataset(FLASHDataset):
 
     @classmethod
     def _is_valid(self, *args, **kwargs):
-        warn_h5py(args[0])
+        # warn_h5py has already checked the signature; don't read it twice
+        if not warn_h5py(args[0]):
+            return False
         try:
-            fileh = HDF5FileHandler(args[0])
-            if (
-                "bounding box" not in fileh["/"].keys()
-                and "localnp" in fileh["/"].keys()
-            ):
-                return True
+            with h5py.File(args[0], mode="r") as fileh:
+                return "bounding box" not in fileh and "localnp" in fileh
         except (OSError, ImportError):
             pass
         return False
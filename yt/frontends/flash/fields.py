@@ -88,12 +88,23 @@ class FLASHFieldInfo(FieldInfoContainer):
         unit_system = self.ds.unit_system
         # Adopt FLASH 4.6 value for Na
         Na = self.ds.quan(6.022140857e23, "g**-1")
-        for i in range(1, 1000):
+        # Only register the energy groups (r001 to r999) that are actually in
+        # the file, rather than all 999 possible ones.
+        energy_groups = sorted(
+            fname
+            for ftype, fname in self.field_list
+            if ftype == "flash"
+            and len(fname) == 4
+            and fname[0] == "r"
+            and fname[1:].isdigit()
+            and fname != "r000"
+        )
+        for fname in energy_groups:
             self.add_output_field(
-                ("flash", f"r{i:03}"),
+                ("flash", fname),
                 sampling_type="cell",
                 units="",
-                display_name=f"Energy Group {i}",
+                display_name=f"Energy Group {int(fname[1:])}",
             )
         # Add energy fields
         def ekin(data):
@@ -0,0 +1,183 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from yt.frontends.flash.data_structures import _read_dataset
+from yt.testing import assert_equal, requires_module
+from yt.utilities.on_demand_imports import _h5py as h5py
+
+
+def _check_read_dataset(fn, name, selection=(), mmapped=False):
+    with h5py.File(fn, mode="r") as f:
+        arr = _read_dataset(f, name, selection)
+        expected = f[name][selection]
+        assert_equal(arr.dtype, expected.dtype)
+        assert_equal(arr, expected)
+        assert_equal(isinstance(arr, np.memmap), mmapped)
+        if mmapped:
+            assert not arr.flags.writeable
+
+
+@requires_module("h5py")
+def test_read_dataset():
+    tmpdir = tempfile.mkdtemp()
+    rs = np.random.RandomState(0x4D3D3D3)
+    bbox = rs.random_sample((16, 3, 2))
+    gid = rs.randint(-1, 16, size=(16, 15)).astype("int32")
+
+    fn = os.path.join(tmpdir, "native.h5")
+    with h5py.File(fn, mode="w") as f:
+        f.create_dataset("bounding box", data=bbox)
+        f.create_dataset("gid", data=gid)
+    _check_read_dataset(fn, "bounding box", mmapped=True)
+    _check_read_dataset(fn, "gid", mmapped=True)
+    _check_read_dataset(fn, "gid", np.s_[:, -8:], mmapped=True)
+
+    fn = os.path.join(tmpdir, "big_endian.h5")
+    with h5py.File(fn, mode="w") as f:
+        f.create_dataset("bounding box", data=bbox.astype(">f8"))
+        f.create_dataset("gid", data=gid.astype(">i4"))
+    _check_read_dataset(fn, "bounding box", mmapped=True)
+    _check_read_dataset(fn, "gid", np.s_[:, -8:], mmapped=True)
+
+    fn = os.path.join(tmpdir, "chunked.h5")
+    with h5py.File(fn, mode="w") as f:
+        f.create_dataset("bounding box", data=bbox, compression="gzip")
+        f.create_dataset("gid", data=gid, chunks=(4, 15), compression="gzip")
+    _check_read_dataset(fn, "bounding box")
+    _check_read_dataset(fn, "gid", np.s_[:, -8:])
+
+    fn = os.path.join(tmpdir, "userblock.h5")
+    with h5py.File(fn, mode="w", userblock_size=512) as f:
+        f.create_dataset("bounding box", data=bbox)
+        f.create_dataset("gid", data=gid)
+    _check_read_dataset(fn, "bounding box")
+    _check_read_dataset(fn, "gid", np.s_[:, -8:])
+
+    shutil.rmtree(tmpdir)
+
+
+def _write_fake_flash(fn, dimensionality, bbox, levels, children):
+    # Just enough of a FLASH plot file to build the index from
+    nb = 8 if dimensionality == 3 else 4
+    nchild = 2 ** dimensionality
+    n = len(levels)
+    # The domain is the unit cube
+    domain = {f"{ax}min": 0.0 for ax in "xyz"}
+    domain.update({f"{ax}max": 1.0 for ax in "xyz"})
+
+    def _table(kind, params):
+        vtype = {"integer": "int32", "real": "float64", "string": "S80"}[kind]
+        dtype = [("name", "S80"), ("value", vtype)]
+        return np.array(
+            [(k.ljust(80).encode(), v) for k, v in params.items()], dtype=dtype
+        )
+
+    with h5py.File(fn, mode="w") as f:
+        f.create_dataset("file format version", data=np.array([9], dtype="int32"))
+        f.create_dataset(
+            "integer scalars",
+            data=_table(
+                "integer",
+                {
+                    "nxb": nb,
+                    "nyb": nb,
+                    "nzb": nb if dimensionality == 3 else 1,
+                    "dimensionality": dimensionality,
+                    "globalnumblocks": n,
+                },
+            ),
+        )
+        f.create_dataset("real scalars", data=_table("real", {"time": 0.0}))
+        f.create_dataset(
+            "integer runtime parameters",
+            data=_table(
+                "integer", {"lrefine_min": 1, "nblockx": 1, "nblocky": 1, "nblockz": 1},
+            ),
+        )
+        f.create_dataset("real runtime parameters", data=_table("real", domain))
+        f.create_dataset(
+            "string runtime parameters",
+            data=_table("string", {"geometry": b"cartesian".ljust(80)}),
+        )
+        f.create_dataset("unknown names", data=np.array([[b"dens"]], dtype="S4"))
+        f.create_dataset("bounding box", data=np.asarray(bbox, dtype="float64"))
+        f.create_dataset("refine level", data=np.asarray(levels, dtype="int32"))
+        # neighbors, parent, then children; only the children are read
+        gid = -np.ones((n, 2 * dimensionality + 1 + nchild), dtype="int32")
+        for i, kids in children.items():
+            gid[i, -nchild:] = [k + 1 for k in kids]
+        f.create_dataset("gid", data=gid)
+
+
+def _fake_flash_tree(dimensionality):
+    # A root grid with one refined child, plus an orphan grid above level
+    # 0.  The orphan comes first on disk so that the levels are not sorted.
+    nchild = 2 ** dimensionality
+    bbox = np.zeros((2 + nchild, 3, 2))
+    bbox[:, :, 1] = 1.0
+    levels = [2, 1] + [2] * nchild
+    # The orphan gets a cell width its level would not imply on its own
+    bbox[0, :dimensionality] = [0.0, 0.125]
+    for n in range(nchild):
+        for d in range(dimensionality):
+            lo = 0.5 * ((n >> d) & 1)
+            bbox[2 + n, d] = [lo, lo + 0.5]
+    children = {1: list(range(2, 2 + nchild))}
+    return bbox, levels, children
+
+
+@requires_module("h5py")
+def test_grid_dds():
+    from yt.data_objects.index_subobjects.grid_patch import AMRGridPatch
+    from yt.frontends.flash.api import FLASHDataset
+
+    tmpdir = tempfile.mkdtemp()
+    for dimensionality in (2, 3):
+        fn = os.path.join(tmpdir, f"fake_{dimensionality}d_hdf5_plt_cnt_0000")
+        _write_fake_flash(fn, dimensionality, *_fake_flash_tree(dimensionality))
+        ds = FLASHDataset(fn)
+        index = ds.index
+        assert_equal(index.max_level, 1)
+        assert index.grids[0].Parent is None
+        # What AMRGridPatch._setup_dx used to give, parents first, followed by
+        # the fixups for the unused dimensions.
+        DW = (ds.domain_right_edge - ds.domain_left_edge).d
+        expected = np.empty_like(index._grid_dds)
+        for g in sorted(index.grids, key=lambda g: g.Level):
+            AMRGridPatch._setup_dx(g)
+            expected[g.id - g._id_offset] = g.dds.d
+        if ds.dimensionality < 3:
+            expected[:, 2] = DW[2]
+        if ds.dimensionality < 2:
+            expected[:, 1] = DW[1]
+        assert_equal(index._grid_dds, expected)
+        # clear_data goes back through FLASHGrid._setup_dx
+        for g in index.grids:
+            g.clear_data()
+        assert_equal(np.array([g.dds.d for g in index.grids]), expected)
+        ds.close()
+    shutil.rmtree(tmpdir)
+
+
+@requires_module("h5py")
+def test_particle_filename():
+    from yt.frontends.flash.api import FLASHDataset
+
+    tmpdir = tempfile.mkdtemp()
+    # Plot files without a matching particle file have none
+    fn = os.path.join(tmpdir, "fake_hdf5_plt_cnt_0000")
+    _write_fake_flash(fn, 2, *_fake_flash_tree(2))
+    ds = FLASHDataset(fn)
+    assert ds.particle_filename is None
+    ds.close()
+    # Checkpoint files hold their own particles
+    fn = os.path.join(tmpdir, "fake_hdf5_chk_0000")
+    _write_fake_flash(fn, 2, *_fake_flash_tree(2))
+    ds = FLASHDataset(fn)
+    assert_equal(ds.particle_filename, fn)
+    assert ds._particle_handle is ds._handle
+    ds.close()
+    shutil.rmtree(tmpdir)
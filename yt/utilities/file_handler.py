@@ -19,6 +19,7 @@ def warn_h5py(fn):
         raise RuntimeError(
             "This appears to be an HDF5 file, " "but h5py is not installed."
         )
+    return needs_h5py
 
 
 class HDF5FileHandler:
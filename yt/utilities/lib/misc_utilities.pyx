@@ -563,6 +563,46 @@ def get_box_grids_below_level(
                     break
             if inside == 1: mask[i] = 1
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def children_to_csr(np.int64_t[:, :] children, int num_threads = 0):
+    """
+    Convert a table of 1-indexed child ids, one row per grid and with
+    non-positive entries marking empty slots, into a CSR representation of
+    the grid tree.  Returns (indptr, indices, parent_of), all 0-indexed: the
+    children of grid i are indices[indptr[i]:indptr[i + 1]] and parent_of[i]
+    is the parent of grid i, or -1 for root grids.
+    """
+    cdef np.int64_t n = children.shape[0]
+    cdef np.int64_t nc = children.shape[1]
+    cdef np.int64_t i, j, c, v
+    cdef np.int64_t[:] indptr = np.zeros(n + 1, dtype="int64")
+    cdef np.int64_t[:] parent_of = np.full(n, -1, dtype="int64")
+    cdef np.int64_t[:] indices
+    # First count the children of each grid ...
+    for i in prange(n, nogil=True, num_threads=num_threads):
+        c = 0
+        for j in range(nc):
+            v = children[i, j]
+            # not using += operator so that variable is not automatically reduced
+            if v > 0 and v <= n:
+                c = c + 1
+        indptr[i + 1] = c
+    for i in range(n):
+        indptr[i + 1] += indptr[i]
+    indices = np.empty(indptr[n], dtype="int64")
+    # ... then fill them in.  Each child has a single parent, so no two
+    # rows ever write to the same parent_of entry.
+    for i in prange(n, nogil=True, num_threads=num_threads):
+        c = indptr[i]
+        for j in range(nc):
+            v = children[i, j]
+            if v > 0 and v <= n:
+                indices[c] = v - 1
+                parent_of[v - 1] = i
+                c = c + 1
+    return np.asarray(indptr), np.asarray(indices), np.asarray(parent_of)
+
 @cython.cdivision(True)
 @cython.boundscheck(False)
 @cython.wraparound(False)
@@ -0,0 +1,38 @@
+import numpy as np
+
+from yt.testing import assert_equal
+from yt.utilities.lib.misc_utilities import children_to_csr
+
+
+def test_children_to_csr():
+    # Grid 1 has children 2 and 3, grid 3 has child 4 (all 1-indexed), and
+    # -1 marks an empty slot.
+    children = np.array([[2, 3], [-1, -1], [4, -1], [-1, -1]], dtype="int64")
+    indptr, indices, parent_of = children_to_csr(children)
+    assert_equal(indptr, [0, 2, 2, 3, 3])
+    assert_equal(indices, [1, 2, 3])
+    assert_equal(parent_of, [-1, 0, 0, 2])
+
+
+def test_children_to_csr_random_tree():
+    # Every grid after the first gets a random earlier grid as its parent
+    rng = np.random.RandomState(0x4D3D3D3)
+    n, nc = 512, 8
+    parents = np.array([rng.randint(0, i) for i in range(1, n)])
+    children = np.full((n, nc), -1, dtype="int64")
+    fill = np.zeros(n, dtype="int64")
+    kept = []
+    for child, parent in enumerate(parents, start=1):
+        if fill[parent] == nc:
+            continue
+        children[parent, fill[parent]] = child + 1
+        fill[parent] += 1
+        kept.append((child, parent))
+    indptr, indices, parent_of = children_to_csr(children)
+    assert_equal(np.diff(indptr), fill)
+    expected_parent = np.full(n, -1, dtype="int64")
+    for child, parent in kept:
+        expected_parent[child] = parent
+    assert_equal(parent_of, expected_parent)
+    for i in range(n):
+        assert_equal(indices[indptr[i] : indptr[i + 1]], children[i, : fill[i]] - 1)